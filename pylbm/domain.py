@@ -8,7 +8,6 @@ Domain definitions for LBM
 """
 import logging
 import sys
-import copy
 import numpy as np
 import mpi4py.MPI as mpi
 
@@ -271,7 +270,14 @@ class Domain:
         self.dx = dico['space_step']
         self.dim = self.geom.dim
 
-        self.box_label = copy.copy(self.geom.box_label)
+        # the unique velocities as an array of shape (unvtot, dim)
+        # and the indices of the nonzero ones
+        self._v_table = np.asarray(
+            [v.v for v in self.stencil.unique_velocities], dtype='int'
+        ).reshape(self.stencil.unvtot, self.dim)
+        self._v_moves = np.flatnonzero(np.any(self._v_table != 0, axis=1))
+
+        self.box_label = list(self.geom.box_label)
 
         self.mpi_topo = None
         self.construct_mpi_topology(dico)
@@ -291,15 +297,17 @@ class Domain:
 
         # distance to the borders
         total_size = [self.stencil.unvtot] + self.shape_halo
-        self.in_or_out = self.valin*np.ones(self.shape_halo)
-        self.distance = self.valin*np.ones(total_size)
-        self.flag = self.valin*np.ones(total_size, dtype='int')
+        self.in_or_out = np.full(self.shape_halo, self.valout, dtype='float')
+        self.distance = np.full(total_size, self.valin, dtype='float')
+        self.flag = np.full(total_size, self.valin, dtype=np.int32)
 
         # compute the distance and the flag for the primary box
         self.__add_init(self.box_label)
+        # the cells that are out, updated by each element
+        is_out = self.in_or_out == self.valout
         for elem in self.geom.list_elem:
             # treat each element of the geometry
-            self.__add_elem(elem)
+            self.__add_elem(elem, is_out)
 
         log.info(self.__str__())
 
@@ -427,12 +435,10 @@ class Domain:
         halo_size = np.asarray(self.stencil.vmax)
         halo_beg = self.dx*(halo_size - 0.5)
 
+        # the points are exactly spaced by dx from the first one
         self.coords_halo = [
-            np.linspace(
-                phys_box[k][0] + self.dx*region[k][0] - halo_beg[k],
-                phys_box[k][0] + self.dx*region[k][1] + halo_beg[k],
-                region_size[k] + 2*halo_size[k]
-            )
+            phys_box[k][0] + self.dx*region[k][0] - halo_beg[k]
+            + self.dx*np.arange(region_size[k] + 2*halo_size[k])
             for k in range(self.dim)
         ]
 
@@ -441,6 +447,14 @@ class Domain:
             for k in range(self.dim)
         ]
 
+        # the coordinates with halo in one array padded to the longest
+        # direction to gather the coordinates of points in one go
+        self._coords_stack = np.zeros(
+            (self.dim, max(c.size for c in self.coords_halo))
+        )
+        for k, coords_k in enumerate(self.coords_halo):
+            self._coords_stack[k, :coords_k.size] = coords_k
+
     def get_bounds_halo(self):
         """
         Return the coordinates of the bottom right and upper left corner of the
@@ -468,138 +482,220 @@ class Domain:
         halo_size = np.asarray(self.stencil.vmax)
         phys_domain = [slice(h, -h) for h in halo_size]
 
-        self.in_or_out[:] = self.valout
-
-        in_view = self.in_or_out[tuple(phys_domain)]
-        in_view[:] = self.valin
+        # the halo points are already out except on the interfaces
+        # with the other processes where they are in the global domain
+        in_domain = [
+            slice(0 if label[2*d] == -2 else h,
+                  None if label[2*d + 1] == -2 else -h)
+            for d, h in enumerate(halo_size)
+        ]
+        self.in_or_out[tuple(in_domain)] = self.valin
 
         phys_domain.insert(0, slice(None))
         dist_view = self.distance[tuple(phys_domain)]
         flag_view = self.flag[tuple(phys_domain)]
 
-        def new_indices(dvik, iuv, indices, dist_view):
-            new_ind = copy.deepcopy(indices)
-            ind = np.where(dist_view[tuple(indices)] > dvik)
-            i = 1
-            for j in range(self.dim):
-                if j != iuv:
-                    new_ind[j + 1] = ind[i]
-                    i += 1
-            return new_ind
-
         s = self.stencil
         uvels = [s.uvx, s.uvy, s.uvz]
 
         for iuvel, uvel in enumerate(uvels[:self.dim]):
-            for k, vk in np.ndenumerate(uvel):
-                indices = [k] + [slice(None)]*self.dim
+            # the distances of a band are broadcast
+            # along the other directions
+            shape = [1]*self.dim
+            shape[iuvel] = -1
+            for k, vk in enumerate(uvel):
+                indices = [slice(None)]*self.dim
                 if vk < 0 and label[2*iuvel] != -2:
-                    for i in range(-vk):
-                        indices[iuvel + 1] = i
-                        dvik = -(i + .5)/vk
-                        nind = new_indices(dvik, iuvel, indices, dist_view)
-                        dist_view[tuple(nind)] = dvik
-                        flag_view[tuple(nind)] = label[2*iuvel]
+                    # the first -vk points reach the border
+                    indices[iuvel] = slice(None, -vk)
+                    dvik = -(np.arange(-vk) + .5)/vk
+                    labelk = label[2*iuvel]
                 elif vk > 0 and label[2*iuvel + 1] != -2:
-                    for i in range(vk):
-                        indices[iuvel + 1] = -i - 1
-                        dvik = (i + .5)/vk
-                        nind = new_indices(dvik, iuvel, indices, dist_view)
-                        dist_view[tuple(nind)] = dvik
-                        flag_view[tuple(nind)] = label[2*iuvel+1]
+                    # the last vk points reach the border
+                    indices[iuvel] = slice(-vk, None)
+                    dvik = (np.arange(vk)[::-1] + .5)/vk
+                    labelk = label[2*iuvel + 1]
+                else:
+                    continue
+                dvik = dvik.reshape(shape)
+                dist_band = dist_view[k][tuple(indices)]
+                flag_band = flag_view[k][tuple(indices)]
+                ind = dist_band > dvik
+                np.copyto(dist_band, dvik, where=ind)
+                np.copyto(flag_band, labelk, where=ind)
+
+    def __sparse_grid(self, space_slice):
+        """
+        Get the sparse grid of the box given by space_slice.
 
-    # pylint: disable=too-many-locals
-    def __add_elem(self, elem):
+        These are the same views of the coordinates as
+        np.meshgrid(..., sparse=True, indexing='ij') without copy.
         """
-        Add an element
+        return [
+            self.coords_halo[d][s].reshape(
+                [-1 if i == d else 1 for i in range(self.dim)]
+            )
+            for d, s in enumerate(space_slice)
+        ]
 
-            - if elem.isfluid = False as a solid part. (bw=0)
-            - if elem.isfluid = True as a fluid part.  (bw=1)
+    def __elem_box(self, elem):
+        """
+        Get the indices of the box around an element
+        adding vmax safety points.
 
-        FIX: this function works only for a 2D problem.
-             Need to be improved and implement for the 3D.
+        The bounds of the element are rounded to the closest points:
+        the truncation could shift the box by one point
+        for a bound close to a point by below.
         """
-        # compute the box around the element adding vmax safety points
-        vmax = self.stencil.vmax
+        vmax = np.asarray(self.stencil.vmax, dtype=np.int64)
         elem_bl, elem_ur = elem.get_bounds()
         phys_bl, _ = self.get_bounds_halo()
+        box_min = np.rint((elem_bl - phys_bl)/self.dx).astype(np.int64)
+        box_max = np.rint((elem_ur - phys_bl)/self.dx).astype(np.int64)
+        return box_min - vmax, box_max + vmax + 1
 
-        tmp = np.array((elem_bl - phys_bl)/self.dx, np.int) - vmax
-        nmin = np.maximum(vmax, tmp)
-        tmp = np.array((elem_ur - phys_bl)/self.dx, np.int) + vmax + 1
-        nmax = np.minimum(vmax + self.shape_in, tmp)
+    def __add_elem_in_or_out(self, elem, is_out, box_min, box_max):
+        """
+        Set in_or_out and is_out with an element on its box.
 
-        # set the grid
-        space_slice = [slice(imin, imax) for imin, imax in zip(nmin, nmax)]
-        total_slice = [slice(None)] + space_slice
-        # local view of the arrays
-        ioo_view = self.in_or_out[tuple(space_slice)]
-        dist_view = self.distance[tuple(total_slice)]
-        flag_view = self.flag[tuple(total_slice)]
+        box_min and box_max are the indices of the box of the element.
+        The box is restricted to the interior domain and to the halo
+        points on the interfaces with the other processes:
+        they are in the global domain.
 
-        tcoords = (self.coords_halo[d][s] for d, s in enumerate(space_slice))
-        grid = np.meshgrid(*tcoords, sparse=True, indexing='ij')
+        Return the boolean array of the points of this box that are
+        inside the element and the first indices of the box,
+        or None if the box is empty.
+        """
+        vmax = np.asarray(self.stencil.vmax, dtype=np.int64)
+        label = np.asarray(self.box_label)
+        hmin = np.maximum(np.where(label[::2] == -2, 0, vmax), box_min)
+        hmax = np.minimum(
+            np.where(label[1::2] == -2, 2*vmax, vmax) + self.shape_in,
+            box_max
+        )
+        if np.any(hmax <= hmin):
+            return None
 
+        space_slice = tuple(
+            slice(imin, imax) for imin, imax in zip(hmin, hmax)
+        )
+        ind_in = elem.point_inside(self.__sparse_grid(space_slice))
+        ioo_view = self.in_or_out[space_slice]
+        out_view = is_out[space_slice]
         if not elem.isfluid:  # add a solid part
-            ind_solid = elem.point_inside(grid)
-            ind_fluid = np.logical_not(ind_solid)
-            ioo_view[ind_solid] = self.valout
+            ioo_view[ind_in] = self.valout
+            out_view[ind_in] = True
         else:  # add a fluid part
-            ind_fluid = elem.point_inside(grid)
-            ind_solid = np.logical_not(ind_fluid)
-            ioo_view[ind_fluid] = self.valin
-
-        for k in range(self.stencil.unvtot):
-            vk = np.asarray(self.stencil.unique_velocities[k].v)
-            if np.any(vk != 0):
-                space_slice = [
-                    slice(imin + vk[d], imax + vk[d])
-                    for imin, imax, d in zip(nmin, nmax, range(self.dim))
-                ]
-                # check the cells that are out
-                # when we move with the vk velocity
-                out_cells = self.in_or_out[tuple(space_slice)] == self.valout
-                # compute the distance and set the boundary label
-                # of each cell and the element with the vk velocity
-                alpha, border = elem.distance(grid, self.dx*vk, 1.)
-                # take the indices where the distance is lower than 1
-                # between a fluid cell and the border of the element
-                # with the vk velocity
-                indx = np.logical_and(alpha > 0, ind_fluid)
-                if out_cells.size != 0:
-                    indx = np.logical_and(indx, out_cells)
-
-                if elem.isfluid:
-                    # take all points in the fluid in the ioo_view
-                    indfluidinbox = ioo_view == self.valin
-                    # take all the fluid points in the box
-                    # (not only in the created element)
-                    # which always are in fluid after a displacement
-                    # of the velocity vk
-                    border_to_interior = np.logical_and(
-                        np.logical_not(out_cells), indfluidinbox
-                    )
-                    dist_view[k][border_to_interior] = self.valin
-                    flag_view[k][border_to_interior] = self.valin
-                else:
-                    dist_view[k][ind_solid] = self.valin
-                    flag_view[k][ind_solid] = self.valin
+            ioo_view[ind_in] = self.valin
+            out_view[ind_in] = False
+        return ind_in, hmin
 
-                # set distance
-                ind4 = np.where(indx)
-                if not elem.isfluid:
-                    ind3 = np.where(alpha[ind4] < dist_view[k][ind4])[0]
-                else:
-                    ind3 = np.where(
-                        np.logical_or(
-                            alpha[ind4] > dist_view[k][ind4],
-                            dist_view[k][ind4] == self.valin
-                        )
-                    )[0]
+    # pylint: disable=too-many-locals
+    def __add_elem(self, elem, is_out):
+        """
+        Add an element
 
-                ind = [i[ind3] for i in ind4]
-                dist_view[k][tuple(ind)] = alpha[tuple(ind)]
-                flag_view[k][tuple(ind)] = border[tuple(ind)]
+            - if elem.isfluid = False as a solid part. (bw=0)
+            - if elem.isfluid = True as a fluid part.  (bw=1)
+
+        is_out is the boolean array of the cells that are out:
+        it is updated with the element.
+
+        FIX: this function works only for a 2D problem.
+             Need to be improved and implement for the 3D.
+        """
+        vmax = np.asarray(self.stencil.vmax, dtype=np.int64)
+        box_min, box_max = self.__elem_box(elem)
+
+        # set in_or_out on the box with the halo of the interfaces
+        inside = self.__add_elem_in_or_out(elem, is_out, box_min, box_max)
+        if inside is None:
+            # the element does not intersect the domain
+            return
+        ind_in, hmin = inside
+
+        nmin = np.maximum(vmax, box_min)
+        nmax = np.minimum(vmax + self.shape_in, box_max)
+        if np.any(nmax <= nmin):
+            # the element does not intersect the interior domain
+            return
+
+        # set the grid of the interior box
+        space_slice = [slice(imin, imax) for imin, imax in zip(nmin, nmax)]
+        # local view of the arrays
+        ioo_view = self.in_or_out[tuple(space_slice)]
+        dist_view = self.distance[(slice(None), *space_slice)]
+        flag_view = self.flag[(slice(None), *space_slice)]
+        grid = self.__sparse_grid(space_slice)
+        ind_in = ind_in[tuple(
+            slice(imin - hi, imax - hi)
+            for imin, imax, hi in zip(nmin, nmax, hmin)
+        )]
+
+        if not elem.isfluid:
+            ind_solid, ind_fluid = ind_in, np.logical_not(ind_in)
+        else:
+            ind_solid, ind_fluid = np.logical_not(ind_in), ind_in
+
+        if elem.isfluid:
+            # take all points in the fluid in the ioo_view
+            indfluidinbox = ioo_view == self.valin
+
+        # work arrays shared by all the velocities
+        indx = np.empty(ioo_view.shape, dtype='bool')
+        mask = np.empty(ioo_view.shape, dtype='bool')
+        mask_valin = np.empty(ioo_view.shape, dtype='bool')
+
+        for k in self._v_moves:
+            vk = self._v_table[k]
+            # the velocity is the slowest axis of distance and flag:
+            # each velocity works on a contiguous slab of the halo
+            dist_k = dist_view[k]
+            flag_k = flag_view[k]
+            # check the cells that are out
+            # when we move with the vk velocity
+            space_slice = [
+                slice(imin + vkd, imax + vkd)
+                for imin, imax, vkd in zip(nmin, nmax, vk)
+            ]
+            out_cells = is_out[tuple(space_slice)]
+            # compute the distance and set the boundary label
+            # of each cell and the element with the vk velocity
+            alpha, border = elem.distance(grid, self.dx*vk, 1.)
+            # take the indices where the distance is lower than 1
+            # between a fluid cell and the border of the element
+            # with the vk velocity
+            np.greater(alpha, 0, out=indx)
+            np.logical_and(indx, ind_fluid, out=indx)
+            np.logical_and(indx, out_cells, out=indx)
+
+            if elem.isfluid:
+                # take all the fluid points in the box
+                # (not only in the created element)
+                # which always are in fluid after a displacement
+                # of the velocity vk
+                np.logical_not(out_cells, out=mask)
+                np.logical_and(mask, indfluidinbox, out=mask)
+                np.copyto(dist_k, self.valin, where=mask)
+                np.copyto(flag_k, self.valin, where=mask)
+            else:
+                np.copyto(dist_k, self.valin, where=ind_solid)
+                np.copyto(flag_k, self.valin, where=ind_solid)
+
+            # set distance
+            # (keep the closest border for a solid part
+            #  and the farthest one for a fluid part)
+            if not elem.isfluid:
+                np.less(alpha, dist_k, out=mask)
+            else:
+                np.greater(alpha, dist_k, out=mask)
+                np.equal(dist_k, self.valin, out=mask_valin)
+                np.logical_or(mask, mask_valin, out=mask)
+            np.logical_and(indx, mask, out=indx)
+            np.copyto(dist_k, alpha, where=indx)
+            # the labels of the elements are stored as floats
+            np.copyto(flag_k, border, casting='unsafe', where=indx)
 
     def list_of_labels(self):
         """
@@ -683,12 +779,14 @@ class Domain:
         if isinstance(label, int):
             label = (label,)
 
+        # index of the direction of each row of the gathered coordinates
+        axes = np.arange(self.dim)[:, np.newaxis]
+
         def get_inorout_points(val):
             # returns the coordinates where the value is equal to val
-            ind = np.where(self.in_or_out == val)
-            data = np.zeros((ind[0].size, 3))
-            for i in range(self.dim):
-                data[:, i] = self.coords_halo[i][ind[i]]
+            ind = np.asarray(np.nonzero(self.in_or_out == val))
+            data = np.zeros((ind.shape[1], 3))
+            data[:, :self.dim] = self._coords_stack[axes, ind].T
             return data
 
         # visualize the inner points
@@ -707,46 +805,56 @@ class Domain:
                 dim=self.dim
             )
 
-        def get_bounds(label, k):
-            # returns the indices of the bounds
-            # for the kth velocity and for the given labels
-            # and the corresponding distances
+        # points that reach a border (with one of the given labels)
+        # for all the velocities at once
+        # (only when the distances or the bounds are shown)
+        if view_distance or view_bound:
+            bound_mask = self.distance <= 1
             if label is not None:
-                dummy = np.zeros(self.distance.shape[1:])
-                for labelk in label:
-                    dummy += self.flag[k, :] == labelk
-                dummy *= self.distance[k, :] <= 1
-                indbord = np.where(dummy)
-            else:
-                indbord = np.where(self.distance[k, :] <= 1)
-            if indbord:
-                data = np.zeros((indbord[0].size, max(2, self.dim)))
-                for i in range(self.dim):
-                    data[:, i] = self.coords_halo[i][indbord[i]]
-                dist = self.distance[k][indbord]
-                return data, dist
-            else:
-                return None, 0
+                bound_mask &= np.isin(self.flag, label)
+
+        def get_bounds(view_k):
+            # returns, for each velocity of view_k,
+            # the coordinates of the points that reach a border
+            # and the corresponding distances
+            if not view_k:
+                return []
+            view_k = np.asarray(view_k, dtype='int')
+            indbord = np.nonzero(bound_mask[view_k])
+            data = np.zeros((indbord[0].size, max(2, self.dim)))
+            data[:, :self.dim] = self._coords_stack[
+                axes, np.asarray(indbord[1:], dtype='int')
+            ].T
+            dist = self.distance[(view_k[indbord[0]],) + indbord[1:]]
+            # the points are sorted by velocity
+            splits = np.cumsum(
+                np.bincount(indbord[0], minlength=view_k.size)
+            )[:-1]
+            return zip(view_k, np.split(data, splits), np.split(dist, splits))
 
         # visualize the distance as small lines
-        for k in view_distance:
-            bound, dist = get_bounds(label, k)
+        # (all the velocities in one call with a color per segment)
+        lines, colors = [], []
+        for k, bound, dist in get_bounds(view_distance):
             if bound.size != 0:
                 vk = self.stencil.unique_velocities[k].v_full
-                color = _fix_color(vk)
-                lines = np.empty((2*bound.shape[0], max(2, self.dim))) #pylint: disable=unsubscriptable-object
-                lines[::2, :] = bound
-                lines[1::2, :] = bound \
-                    + self.dx*np.outer(dist, vk[:max(2, self.dim)])
-                view.segments(lines, alpha=0.5, width=2, color=color)
+                lines.append(np.stack(
+                    [bound, bound + self.dx*np.outer(dist, vk[:bound.shape[1]])],
+                    axis=1
+                ).reshape(-1, bound.shape[1]))
+                colors.append(np.tile(_fix_color(vk), (dist.size, 1)))
+        if lines:
+            view.segments(
+                np.concatenate(lines), alpha=0.5, width=2,
+                color=np.concatenate(colors)
+            )
 
         # visualize the bounds as diamond
-        for k in view_bound:
-            bound, dist = get_bounds(label, k)
+        for k, bound, dist in get_bounds(view_bound):
             if bound.size != 0:
                 vk = self.stencil.unique_velocities[k].v_full
                 color = np.array([[*_fix_color(vk)]])
-                lines = bound + self.dx*np.outer(dist, vk[:max(2, self.dim)])
+                lines = bound + self.dx*np.outer(dist, vk[:bound.shape[1]])
                 view.markers(lines, size, symbol='d', color=color)
 
         fig.show()
@@ -135,6 +135,9 @@ class BaseCircle:
         # orthogonalization of the two vectors
         self.v1 = np.asarray(v1)
         v2 = np.asarray(v2)
+        # half sizes of the box around the base
+        # (the points center + a v1 + b v2 with a**2 + b**2 <= 1)
+        self.half_size = np.sqrt(self.v1**2 + v2**2)
         self.v2 = v2 - np.inner(v2, self.v1) * self.v1 \
             / np.inner(self.v1, self.v1)
         nv2 = np.linalg.norm(self.v2)
@@ -148,7 +151,7 @@ class BaseCircle:
         """
         Get the bounds of the base
         """
-        return self.center - self.radius, self.center + self.radius
+        return self.center - self.half_size, self.center + self.half_size
 
     # pylint: disable=no-self-use
     def point_inside(self, grid):
@@ -258,8 +261,9 @@ class BaseEllipse:
         """
         Get the bounds of the base
         """
-        r = max(np.linalg.norm(self.v1), np.linalg.norm(self.v2))
-        return self.center - r, self.center + r
+        # the points center + a v1 + b v2 with a**2 + b**2 <= 1
+        half_size = np.sqrt(self.v1**2 + self.v2**2)
+        return self.center - half_size, self.center + half_size
 
     # pylint: disable=no-self-use
     def point_inside(self, grid):
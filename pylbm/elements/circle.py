@@ -111,8 +111,8 @@ class Circle(Element):
 
         """
         x, y = grid
-        v2 = np.asarray([x - self.center[0], y - self.center[1]])
-        return (v2[0]**2 + v2[1]**2) <= self.radius**2
+        v2x, v2y = x - self.center[0], y - self.center[1]
+        return (v2x**2 + v2y**2) <= self.radius**2
 
     def distance(self, grid, v, dmax=None):
         """
@@ -13,13 +13,15 @@ Cylinder element with
 """
 
 # pylint: disable=invalid-name, no-member, attribute-defined-outside-init
-# pylint: disable=wildcard-import, unused-wildcard-import
 
 import logging
 # from textwrap import dedent
+from functools import reduce
 import numpy as np
 
-from .base import *  # pylint: disable=redefined-builtin
+from .base import Element, BaseCircle, BaseEllipse
+from .base import BaseTriangle, BaseParallelogram
+from .utils import distance_by_blocks
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
@@ -42,6 +44,41 @@ class Cylinder(Element):
         self.A[:, 1] = self.v2
         self.A[:, 2] = self.w
         self.iA = np.linalg.inv(self.A)
+        # the columns of the non zero coefficients of each row of iA:
+        # the null products are skipped in coords_in_frame
+        # (six of them for a cylinder along an axis)
+        self.iA_nonzero = [np.flatnonzero(row) for row in self.iA]
+
+    def coords_in_frame(self, grid):
+        """
+        return the coordinates of the points
+        in the frame of the cylinder.
+
+        Parameters
+        ----------
+
+        grid : ndarray
+            coordinates of the points
+
+        Returns
+        -------
+
+        tuple
+            the three new coordinates
+
+        Notes
+        -----
+
+        for a sparse grid, a new coordinate only depends
+        on the directions of the non zero coefficients of iA
+        and is not expanded along the other ones.
+
+        """
+        coords = [g - c for g, c in zip(grid, self.center)]
+        return tuple(
+            reduce(np.add, (row[j]*coords[j] for j in nonzero))
+            for row, nonzero in zip(self.iA, self.iA_nonzero)
+        )
 
     def get_bounds(self):
         """
@@ -54,9 +91,8 @@ class Cylinder(Element):
             minimal box where the cylinder is included
 
         """
-        lw = [0.5*abs(self.w[k]) for k in range(len(self.w))]
+        lw = np.abs(self.w)
         bounds_base = self.base.get_bounds()
-        print(bounds_base)
         return bounds_base[0] - lw, bounds_base[1] + lw
 
     def point_inside(self, grid):
@@ -82,22 +118,12 @@ class Cylinder(Element):
             Array of boolean (True inside the cylinder, False otherwise)
 
         """
-        x, y, z = grid
-        xx = x - self.center[0]
-        yy = y - self.center[1]
-        zz = z - self.center[2]
-        # the new x coordinates
-        x_cyl = self.iA[0, 0]*xx + self.iA[0, 1]*yy + self.iA[0, 2]*zz
-        # the new y coordinates
-        y_cyl = self.iA[1, 0]*xx + self.iA[1, 1]*yy + self.iA[1, 2]*zz
-        # the new z coordinates
-        z_cyl = self.iA[2, 0]*xx + self.iA[2, 1]*yy + self.iA[2, 2]*zz
+        x_cyl, y_cyl, z_cyl = self.coords_in_frame(grid)
         return np.logical_and(
             self.base.point_inside((x_cyl, y_cyl)),
             np.abs(z_cyl) <= 1.
         )
 
-    # pylint: disable=too-many-locals
     def distance(self, grid, v, dmax=None):
         """
         Compute the distance in the v direction between
@@ -123,60 +149,94 @@ class Cylinder(Element):
             array of distances
 
         """
-        x, y, z = grid
+        return distance_by_blocks(
+            lambda grid: self._distance_block(grid, v, dmax), grid
+        )
 
+    # pylint: disable=too-many-locals
+    def _distance_block(self, grid, v, dmax):
+        """
+        Compute the distance in the v direction between
+        the cylinder and a block of points.
+        """
         # rewritte the coordinates in the frame of the cylinder
         v_cyl = self.iA.dot(np.asarray(v))  # the velocity
-        xx = x - self.center[0]
-        yy = y - self.center[1]
-        zz = z - self.center[2]
-        # the new x coordinates
-        x_cyl = self.iA[0, 0]*xx + self.iA[0, 1]*yy + self.iA[0, 2]*zz
-        # the new y coordinates
-        y_cyl = self.iA[1, 0]*xx + self.iA[1, 1]*yy + self.iA[1, 2]*zz
-        # the new z coordinates
-        z_cyl = self.iA[2, 0]*xx + self.iA[2, 1]*yy + self.iA[2, 2]*zz
+        # the coordinates are expanded without copy to the shape of the grid
+        x_cyl, y_cyl, z_cyl = np.broadcast_arrays(*self.coords_in_frame(grid))
+        # with a single label, the border is only filled at the end
+        uniform_label = len(set(self.label)) == 1
 
         # considering the infinite cylinder
-        alpha, border = self.base.distance(
-            (x_cyl, y_cyl),
-            v_cyl[:-1],
-            dmax, self.label[:-2]
-        )
+        # only for the points that can reach the side before dmax
+        # when most of them stay too high or too low
+        # (twice the displacement: a margin for the rounding errors)
+        active = None
+        if dmax is not None:
+            active = np.abs(z_cyl) <= 1. + 2*dmax*abs(v_cyl[2])
+            if 2*np.count_nonzero(active) > active.size:
+                # the selection would cost more than it saves
+                active = None
+        if active is None:
+            alpha, border = self.base.distance(
+                (x_cyl, y_cyl),
+                v_cyl[:-1],
+                dmax, self.label[:-2]
+            )
+        else:
+            alpha = -np.ones(z_cyl.shape)
+            border = -np.ones(z_cyl.shape)
+            alpha[active], border[active] = self.base.distance(
+                (x_cyl[active], y_cyl[active]),
+                v_cyl[:-1],
+                dmax, self.label[:-2]
+            )
         # indices where the intersection is too high or to low
-        alpha[alpha < 0] = 1.e16
-        ind = np.logical_and(alpha > 0, np.abs(z_cyl + alpha*v_cyl[2]) > 1.)
-        alpha[ind] = 1.e16
-        border[ind] = -1.
+        # (the masks and the height are computed in place)
+        z_side = alpha*v_cyl[2]
+        z_side += z_cyl
+        ind = np.abs(z_side, out=z_side) > 1.
+        ind &= alpha > 0
+        # no intersection: infinite distance
+        alpha[alpha < 0] = np.inf
+        alpha[ind] = np.inf
+        if not uniform_label:
+            border[ind] = -1.
 
         # considering the two planes
-        dummyf = self.base.point_inside
-        if v_cyl[2] == 0:  # to avoid vertical velocities
-            decal = 1.e-16
-        else:
-            decal = 0.
-        alpha_top = (1.-z_cyl)/(v_cyl[2] + decal)
-        ind = np.logical_or(
-            np.logical_or(alpha_top < 0, alpha_top > dmax),
-            np.logical_not(dummyf(
-                (x_cyl + alpha_top*v_cyl[0], y_cyl + alpha_top*v_cyl[1])
+        # (never reached with a velocity parallel to them)
+        if v_cyl[2] != 0:
+            # the top and the bottom are stacked
+            # to test the hits with one call to the base
+            alpha_p = np.stack([1.-z_cyl, -1.-z_cyl])
+            alpha_p /= v_cyl[2]
+            # no intersection when the plane is behind the point,
+            # too far or hit outside of the base
+            # (the mask is built and applied in place)
+            ind = alpha_p < 0
+            ind |= alpha_p > dmax
+            ind |= np.logical_not(self.base.point_inside(
+                (x_cyl + alpha_p*v_cyl[0], y_cyl + alpha_p*v_cyl[1])
             ))
-        )
-        alpha_top[ind] = 1.e16
-        alpha_bot = -(1.+z_cyl)/(v_cyl[2] + decal)
-        ind = np.logical_or(
-            np.logical_or(alpha_bot < 0, alpha_bot > dmax),
-            np.logical_not(dummyf(
-                (x_cyl + alpha_bot*v_cyl[0], y_cyl + alpha_bot*v_cyl[1])
-            ))
-        )
-        alpha_bot[ind] = 1.e16
-
-        # considering the first intersection point
-        alpha = np.amin([alpha, alpha_top, alpha_bot], axis=0)
-        border[alpha == alpha_top] = self.label[-1]
-        border[alpha == alpha_bot] = self.label[-2]
-        alpha[alpha == 1.e16] = -1.
+            np.copyto(alpha_p, np.inf, where=ind)
+            alpha_top, alpha_bot = alpha_p
+
+            # considering the first intersection point
+            # (in place: no stacking of the three distances,
+            #  the top wins a tie with the side and the bottom with the top)
+            if uniform_label:
+                np.minimum(alpha, alpha_p.min(axis=0), out=alpha)
+            else:
+                ind_top = alpha_top <= alpha
+                np.minimum(alpha, alpha_top, out=alpha)
+                ind_bot = alpha_bot <= alpha
+                np.minimum(alpha, alpha_bot, out=alpha)
+                border[ind_top] = self.label[-1]
+                border[ind_bot] = self.label[-2]
+        ind = np.isinf(alpha)
+        alpha[ind] = -1.
+        if uniform_label:
+            border.fill(self.label[0])
+        border[ind] = -1.
 
         return alpha, border
 
@@ -196,33 +256,28 @@ class Cylinder(Element):
         if isinstance(color, int):
             color = [color]*self.number_of_bounds
         lx_b, ly_b = self.base._visualize()  # pylint: disable=protected-access
-        c = self.center
+        c = self.center.reshape(3, 1, 1)
+
+        def to_physical(X_cyl, Y_cyl, Z_cyl):
+            # the coordinates of the frame of the cylinder
+            # written in the physical frame in one product by A
+            return c + np.tensordot(
+                self.A, np.stack([X_cyl, Y_cyl, Z_cyl]), axes=1
+            )
+
+        z_b = [-1., 1.]
         for k in range(len(lx_b)-2):  # loop over the faces of the side
-            x_b, y_b = lx_b[k], ly_b[k]
-            z_b = [-1., 1.]
-            X_cyl, Z_cyl = np.meshgrid(x_b, z_b)
-            Y_cyl, Z_cyl = np.meshgrid(y_b, z_b)
-            X = c[0] + self.A[0, 0]*X_cyl \
-                + self.A[0, 1]*Y_cyl \
-                + self.A[0, 2]*Z_cyl
-            Y = c[1] + self.A[1, 0]*X_cyl \
-                + self.A[1, 1]*Y_cyl \
-                + self.A[1, 2]*Z_cyl
-            Z = c[2] + self.A[2, 0]*X_cyl \
-                + self.A[2, 1]*Y_cyl \
-                + self.A[2, 2]*Z_cyl
+            X_cyl, Z_cyl = np.meshgrid(lx_b[k], z_b)
+            Y_cyl, Z_cyl = np.meshgrid(ly_b[k], z_b)
+            X, Y, Z = to_physical(X_cyl, Y_cyl, Z_cyl)
             viewer.surface(X, Y, Z, color[k], alpha=alpha)
         vv = np.sin(np.linspace(0, np.pi, 10))
         Xbase = np.outer(lx_b[-2], vv)
         Ybase = np.outer(ly_b[-2], vv)
         Zbase = np.ones(Xbase.shape)
-        X = c[0] + self.A[0, 0]*Xbase + self.A[0, 1]*Ybase + self.A[0, 2]*Zbase
-        Y = c[1] + self.A[1, 0]*Xbase + self.A[1, 1]*Ybase + self.A[1, 2]*Zbase
-        Z = c[2] + self.A[2, 0]*Xbase + self.A[2, 1]*Ybase + self.A[2, 2]*Zbase
+        X, Y, Z = to_physical(Xbase, Ybase, Zbase)
         viewer.surface(X, Y, Z, color=color[-2], alpha=alpha)
-        X = c[0] + self.A[0, 0]*Xbase + self.A[0, 1]*Ybase - self.A[0, 2]*Zbase
-        Y = c[1] + self.A[1, 0]*Xbase + self.A[1, 1]*Ybase - self.A[1, 2]*Zbase
-        Z = c[2] + self.A[2, 0]*Xbase + self.A[2, 1]*Ybase - self.A[2, 2]*Zbase
+        X, Y, Z = to_physical(Xbase, Ybase, -Zbase)
         viewer.surface(X, Y, Z, color=color[-2], alpha=alpha)
 
 
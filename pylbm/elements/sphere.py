@@ -15,7 +15,7 @@ import logging
 import numpy as np
 
 from .base import Element
-from .utils import distance_ellipsoid
+from .utils import distance_sphere, distance_by_blocks
 
 log = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
@@ -113,12 +113,10 @@ class Sphere(Element):
 
         """
         x, y, z = grid
-        v2 = np.asarray([
-            x - self.center[0],
-            y - self.center[1],
-            z - self.center[2]
-        ])
-        return (v2[0]**2 + v2[1]**2 + v2[2]**2) <= self.radius**2
+        v2x = x - self.center[0]
+        v2y = y - self.center[1]
+        v2z = z - self.center[2]
+        return (v2x**2 + v2y**2 + v2z**2) <= self.radius**2
 
     def distance(self, grid, v, dmax=None):
         """
@@ -145,13 +143,11 @@ class Sphere(Element):
             array of distances
 
         """
-        x, y, z = grid
-        v1 = self.radius*np.array([1, 0, 0])
-        v2 = self.radius*np.array([0, 1, 0])
-        v3 = self.radius*np.array([0, 0, 1])
-        return distance_ellipsoid(
-            x, y, z, v, self.center,
-            v1, v2, v3, dmax, self.label
+        return distance_by_blocks(
+            lambda grid: distance_sphere(
+                *grid, v, self.center, self.radius, dmax, self.label
+            ),
+            grid
         )
 
     def __str__(self):
@@ -127,10 +127,10 @@ class Triangle(Element):
         """
         x, y = grid
         # Barycentric coordinates
-        v2 = np.asarray([x - self.point[0], y - self.point[1]])
+        v2x, v2y = x - self.point[0], y - self.point[1]
         invdelta = 1./(self.v1[0]*self.v2[1] - self.v1[1]*self.v2[0])
-        u = (v2[0]*self.v2[1] - v2[1]*self.v2[0])*invdelta
-        v = (v2[1]*self.v1[0] - v2[0]*self.v1[1])*invdelta
+        u = (v2x*self.v2[1] - v2y*self.v2[0])*invdelta
+        v = (v2y*self.v1[0] - v2x*self.v1[1])*invdelta
         return np.logical_and(np.logical_and(u >= 0, v >= 0), u + v <= 1)
 
     def distance(self, grid, v, dmax=None):
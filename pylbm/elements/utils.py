@@ -12,6 +12,9 @@ between a point and an object
 
 import numpy as np
 
+# number of points of a block in distance_by_blocks
+BLOCK_SIZE = 65536
+
 
 def intersection_two_lines(p1, v1, p2, v2):
     """
@@ -32,11 +35,12 @@ def distance_lines(x, y, v, p, vt, dmax, label):
     """
     return distance for several lines
     """
-    v2 = np.asarray([x, y])
-    alpha = 1e16*np.ones((x.size, y.size))
-    border = -np.ones((x.size, y.size))
+    # the points of a sparse or of a full grid
+    shape = np.broadcast(x, y).shape
+    alpha = 1e16*np.ones(shape)
+    border = -np.ones(shape)
     for i, vti in enumerate(vt):
-        tmp1, tmp2 = intersection_two_lines(v2, v, p[i], vti)
+        tmp1, tmp2 = intersection_two_lines((x, y), v, p[i], vti)
         if tmp1 is not None:
             if dmax is None:
                 ind = np.logical_and(tmp1 > 0,
@@ -150,3 +154,62 @@ def distance_ellipsoid(x, y, z, v, center, v1, v2, v3, dmax, label):
     alpha[ind] = d[ind]
     border[ind] = label[0]
     return alpha, border
+
+
+def distance_sphere(x, y, z, v, center, radius, dmax, label):
+    """
+    return the distance according
+    a line defined by a point x, y, z and a vector v
+    to a sphere defined by a point c and a radius
+    """
+    # second order equation in d
+    # a d**2 + 2 b d + c = 0
+    # delta = b**2-ac
+    X = x - center[0]
+    Y = y - center[1]
+    Z = z - center[2]
+    a = v[0]**2 + v[1]**2 + v[2]**2
+    b = v[0]*X + v[1]*Y + v[2]*Z
+    c = X**2 + Y**2 + Z**2 - radius**2
+    delta = b**2 - a*c
+    ind = delta >= 0
+    sqrt_delta = np.sqrt(delta[ind])
+    d1 = (-b[ind] - sqrt_delta)/a
+    d2 = (-b[ind] + sqrt_delta)/a
+    # the first intersection in the v direction (d1 <= d2)
+    d = np.where(d1 >= 0, d1, d2)
+
+    alpha = -np.ones(delta.shape)
+    border = -np.ones(delta.shape)
+    if dmax is None:
+        hit = d > 0
+    else:
+        hit = np.logical_and(d > 0, d <= dmax)
+    ind[ind] = hit
+    alpha[ind] = d[hit]
+    border[ind] = label[0]
+    return alpha, border
+
+
+def distance_by_blocks(distance, grid, block_size=BLOCK_SIZE):
+    """
+    return the distance computed by blocks of points
+    along the first axis of the grid
+
+    distance is a function of the grid that returns alpha and border:
+    the temporaries of a block are small enough to stay in cache.
+    """
+    shape = np.broadcast(*grid).shape
+    size = np.prod(shape, dtype='int')
+    if size <= block_size or shape[0] == 1:
+        return distance(grid)
+    step = max(1, block_size*shape[0]//size)
+    alpha = np.empty(shape)
+    border = np.empty(shape)
+    # the coordinates constant along the first axis are not sliced
+    sliced = [np.ndim(g) == len(shape) and np.shape(g)[0] > 1 for g in grid]
+    for i in range(0, shape[0], step):
+        alpha[i:i+step], border[i:i+step] = distance([
+            g[i:i+step] if s else g for g, s in zip(grid, sliced)
+        ])
+    return alpha, border
@@ -0,0 +1 @@
+version = '0.4.1'
\ No newline at end of file
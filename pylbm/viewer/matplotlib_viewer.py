@@ -8,7 +8,6 @@
 # pylint: disable=missing-docstring
 
 import logging
-from six.moves import range
 
 import matplotlib.pyplot as plt
 from matplotlib.patches import Ellipse, Polygon
@@ -455,18 +454,26 @@ class PlotWidget:
 
     # pylint: disable=unused-argument
     def segments(self, pos, width=5, color='k', alpha=1., **kwargs):
-        if pos.shape[1] == 2:
-            for i in range(pos.shape[0]//2):
-                self.ax.plot(
-                    pos[2*i:2*i+2, 0], pos[2*i:2*i+2, 1],
-                    c=color, lw=width, alpha=alpha
-                )
+        # color is one color or an array with one color per segment:
+        # the segments of a same color are drawn as one line
+        # where a nan point separates two segments
+        dim = pos.shape[1]
+        lines = np.full((pos.shape[0]//2, 3, dim), np.nan)
+        lines[:, :2] = pos.reshape(-1, 2, dim)
+        if isinstance(color, np.ndarray) and color.ndim == 2:
+            _, first, group = np.unique(
+                color, axis=0, return_index=True, return_inverse=True
+            )
+            # keep the order of the colors
+            order = np.argsort(first)
+            colors = color[first[order]]
         else:
-            for i in range(pos.shape[0]//2):
-                self.ax.plot(
-                    pos[2*i:2*i+2, 0], pos[2*i:2*i+2, 1], pos[2*i:2*i+2, 2],
-                    c=color, lw=width, alpha=alpha
-                )
+            order = [0]
+            colors = [color]
+            group = np.zeros(lines.shape[0], dtype='int')
+        for igroup, rgb in zip(order, colors):
+            line = lines[group == igroup].reshape(-1, dim)
+            self.ax.plot(*line.T, c=rgb, lw=width, alpha=alpha)
 
     def clear(self):
         self.ax.clf()
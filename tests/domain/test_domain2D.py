@@ -96,3 +96,28 @@ class TestDomain2D:
         dom = pylbm.Domain(dom2d)
 
         check_from_file(dom, fname)
+
+    def test_domain_interface_halo(self, monkeypatch):
+        # the left half of the domain as the subdomain of a process:
+        # its right side becomes an interface with the other process
+        dom2d = copy.deepcopy(self.dom2d)
+        dom2d['box']['label'] = [0, 1, 2, 3]
+        dom2d['space_step'] = 0.0625
+        dom2d['schemes'] = [{'velocities': list(range(9))}]
+        dom2d['elements'] = [pylbm.Parallelogram([0., 0.], [1., 0], [0., 2.], label=20),
+                             pylbm.Circle([0.5, 1.], .3, label=10, isfluid=True),
+                             pylbm.Circle([0.5, .5], .1, label=11)]
+        dom = pylbm.Domain(dom2d)
+
+        def left_region(topo, nx, ny):
+            return [[0, nx//2], [0, ny]]
+        monkeypatch.setattr(pylbm.mpi_topology.MpiTopology, 'get_region', left_region)
+        subdom = pylbm.Domain(dom2d)
+
+        assert(subdom.box_label == [0, -2, 2, 3])
+        # the halo of the interface is in the global domain
+        nx, hx = subdom.shape_in[0], subdom.stencil.vmax[0]
+        assert(np.all(subdom.in_or_out == dom.in_or_out[:nx + 2*hx]))
+        # the interior points do not see a border at the interface
+        assert(np.allclose(subdom.distance[:, :nx + hx], dom.distance[:, :nx + hx], 1e-14))
+        assert(np.all(subdom.flag[:, :nx + hx] == dom.flag[:, :nx + hx]))
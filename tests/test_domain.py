@@ -8,6 +8,7 @@ test the class Domain
 """
 
 import pytest
+import numpy as np
 import pylbm
 
 CASES = [
@@ -97,6 +98,13 @@ CASES = [
 ]
 
 
+ELEMENTS_3D = [
+    pylbm.Parallelepiped([.5, .5, .5], [.7, 0, 0], [0, .8, 0], [0, 0, .9]),
+    pylbm.CylinderCircle([1, 1, 1], [.5, 0, 0], [0, .5, 0], [0, 0, .35]),
+    pylbm.CylinderEllipse([1, 1, 1], [.6, 0, .2], [0, .4, 0], [-.1, 0, .3]),
+]
+
+
 @pytest.fixture(params=CASES)
 def case(request):
     """
@@ -118,3 +126,25 @@ def test_domain_visualize(case):  # pylint: disable=redefined-outer-name
         view_bound=True
     )
     return views.fig
+
+
+@pytest.mark.parametrize(
+    'element', ELEMENTS_3D,
+    ids=[elem.__class__.__name__ for elem in ELEMENTS_3D]
+)
+def test_domain_in_or_out(element):
+    """
+    test that in_or_out matches the points inside the element
+    """
+    dom = pylbm.Domain({
+        'box': {'x': [0, 2], 'y': [0, 2], 'z': [0, 2], 'label': 0},
+        'elements': [element],
+        'space_step': 0.1,
+        'schemes': [{'velocities': list(range(19))}]
+    })
+    inside = element.point_inside(
+        np.meshgrid(*dom.coords, sparse=True, indexing='ij')
+    )
+    interior = tuple(slice(h, -h) for h in dom.stencil.vmax)
+    expected = np.where(inside, dom.valout, dom.valin)
+    assert np.all(dom.in_or_out[interior] == expected)
@@ -1,16 +1,18 @@
 import pytest
 import numpy as np
 import pylbm
+from pylbm.elements.utils import distance_ellipsoid, distance_sphere
+from pylbm.elements.utils import distance_by_blocks
 
 elements = [
     [2, pylbm.Circle([0, 0], 1)],
     [2, pylbm.Ellipse([0, 0], [1, 0], [0, 1])],
     [2, pylbm.Triangle([-1, -1], [0, 2], [2, 0])],
     [2, pylbm.Parallelogram([-1, -1], [0, 2], [2, 0])],
-    # [3, pylbm.CylinderCircle([0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1])],
-    # [3, pylbm.CylinderEllipse([0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1])],
-    # [3, pylbm.CylinderTriangle([0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1])],
-    # [3, pylbm.Parallelepiped([-1, -1, -1], [2, 0, 0], [0, 2, 0], [0, 0, 2])],
+    [3, pylbm.CylinderCircle([0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1])],
+    [3, pylbm.CylinderEllipse([0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1])],
+    [3, pylbm.CylinderTriangle([-1, -1, 0], [2, 0, 0], [0, 2, 0], [0, 0, 1])],
+    [3, pylbm.Parallelepiped([-1, -1, -1], [2, 0, 0], [0, 2, 0], [0, 0, 2])],
     [3, pylbm.Ellipsoid([0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1])],
     [3, pylbm.Sphere([0, 0, 0], 1)],
 ]
@@ -39,3 +41,74 @@ class TestBase:
     #     dist[0] = 1
     #     print(element.distance([np.zeros(1)]*dim, [-1]+[0]*(dim-1)))
     #     assert element.distance([np.zeros(1)]*dim, [-1]+[0]*(dim-1)) == pytest.approx(dist)
+
+
+# sparse grid of points inside and outside of the elements
+GRID_3D = [
+    np.linspace(-1.3, 1.4, 17)[:, np.newaxis, np.newaxis],
+    np.linspace(-1.2, 1.5, 15)[np.newaxis, :, np.newaxis],
+    np.linspace(-1.1, 1.3, 13)[np.newaxis, np.newaxis, :],
+]
+VELOCITIES_3D = [
+    (.3, 0, 0), (0, 0, -.3), (-.3, .3, 0), (.3, .3, .3), (0, -.6, .3)
+]
+
+
+@pytest.mark.parametrize('dmax', [None, 1.])
+@pytest.mark.parametrize('v', VELOCITIES_3D)
+def test_distance_sphere(v, dmax):
+    center, radius = [.1, -.1, .05], .7
+    alpha, border = distance_sphere(*GRID_3D, v, center, radius, dmax, [3])
+    alpha_ell, border_ell = distance_ellipsoid(
+        *GRID_3D, v, center, *(radius*np.eye(3)), dmax, [3]
+    )
+    assert alpha == pytest.approx(alpha_ell, rel=1e-12, abs=1e-12)
+    assert np.all(border == border_ell)
+
+
+GRIDS_3D = {
+    'sparse': GRID_3D,
+    'full': np.broadcast_arrays(*GRID_3D),
+    # a first axis of size one
+    'plane': [GRID_3D[0][:1], GRID_3D[1], GRID_3D[2]],
+    # coordinates of lower dimension
+    'lower': [GRID_3D[0], GRID_3D[1][0], GRID_3D[2].ravel()],
+}
+
+
+@pytest.mark.parametrize('block_size', [1, 100, 600, 10**6])
+@pytest.mark.parametrize('grid', GRIDS_3D.values(), ids=list(GRIDS_3D))
+def test_distance_by_blocks(grid, block_size):
+    def distance(grid):
+        return distance_sphere(*grid, (.3, .3, .3), [.1, -.1, .05], .7, 1., [3])
+    alpha, border = distance_by_blocks(distance, grid, block_size)
+    alpha_ref, border_ref = distance(grid)
+    assert np.array_equal(alpha, alpha_ref)
+    assert np.array_equal(border, border_ref)
+
+
+def test_cylinder_distance_along_plane():
+    # the points of the bottom and of the top of the cylinder
+    # moving parallel to them reach the side
+    cylinder = pylbm.CylinderCircle(
+        [0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], label=[1, 2, 3]
+    )
+    grid = [
+        np.array([-2., -2., -.5, -.5]), np.zeros(4), np.array([-1., 1., -1., 1.])
+    ]
+    alpha, border = cylinder.distance(grid, np.array([1., 0, 0]), 2.)
+    assert alpha == pytest.approx([1., 1., 1.5, 1.5])
+    assert np.all(border == 1)
+
+
+@pytest.mark.parametrize('v', [(-1., 0, 0), (1., 0, 1.5)])
+def test_cylinder_distance_miss(v):
+    # no intersection (the second velocity reaches the infinite
+    # cylinder above the top and the top outside of the base)
+    cylinder = pylbm.CylinderCircle(
+        [0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], label=[1, 2, 3]
+    )
+    grid = [np.array([-2., -2.]), np.zeros(2), np.array([0., .5])]
+    alpha, border = cylinder.distance(grid, np.asarray(v), 2.)
+    assert np.all(alpha == -1)
+    assert np.all(border == -1)